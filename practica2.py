@@ -1,18 +1,57 @@
 import argparse
+import functools
+import gzip
+import hashlib
+import http.client
+import io
 import os
 import re
 import sys
 import urllib.request
-from urllib.parse import urlparse, quote
+from urllib.parse import urlparse, urljoin, quote, unquote
 import socket
+import stat
 import json
 from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
+import threading
+import time
 import base64
+import xml.etree.ElementTree as ET
+import zlib
 
-# Обход бага с DNS в Windows
-socket.getaddrinfo = lambda *args, **kwargs: [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (args[0], args[1]))]
+try:
+    # Необязательно: orjson заметно быстрее разбирает большие mock-репозитории
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
+# Обход бага с DNS в Windows: каждый хост разрешается настоящим
+# getaddrinfo один раз, дальше адреса берутся из кэша. На других
+# платформах системный резолвер не подменяется
+_original_getaddrinfo = socket.getaddrinfo
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_getaddrinfo(host, port, *args, **kwargs):
+    return _original_getaddrinfo(host, port, *args, **kwargs)
+
+
+if sys.platform == 'win32':
+    socket.getaddrinfo = _cached_getaddrinfo
+
+# Символы, недопустимые в имени выходного файла
+_FORBIDDEN_FILENAME_CHARS = frozenset('<>:"/\\|?*\x00')
+
+# Регулярные выражения запасного разбора pom.xml компилируются один раз.
+# Они применяются к копии текста в нижнем регистре, поэтому IGNORECASE не нужен
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+_DEP_MANAGEMENT_RE = re.compile(r'<dependencymanagement>.*?</dependencymanagement>', re.DOTALL)
+_DEP_SECTION_RE = re.compile(r'<dependencies>(.*?)</dependencies>', re.DOTALL)
+_DEP_BLOCK_RE = re.compile(r'<dependency>(.*?)</dependency>', re.DOTALL)
+_GROUP_ID_RE = re.compile(r'<groupid>(.*?)</groupid>')
+_ARTIFACT_ID_RE = re.compile(r'<artifactid>(.*?)</artifactid>')
 
 # =============== ВАЛИДАЦИЯ АРГУМЕНТОВ ===============
 
@@ -33,35 +72,277 @@ def validate_output_file(filename: str) -> str:
     if not filename or not filename.strip():
         raise argparse.ArgumentTypeError("Имя файла изображения не может быть пустым.")
     filename = filename.strip()
-    if re.search(r'[<>:"/\\|?*\x00]', filename):
+    if not _FORBIDDEN_FILENAME_CHARS.isdisjoint(filename):
         raise argparse.ArgumentTypeError("Имя файла содержит недопустимые символы.")
     return filename
 
 
+class _PlainHelpFormatter(argparse.HelpFormatter):
+    """Форматтер без цветного вывода.
+
+    В Python 3.14+ argparse создаёт форматтер на каждый add_argument и каждый
+    раз проверяет, можно ли раскрашивать терминал (несколько чтений
+    переменных окружения). Справка этого инструмента не раскрашивается,
+    поэтому проверка пропускается. В более старых версиях метод не вызывается.
+    """
+
+    def _set_color(self, color, *args, **kwargs):
+        super()._set_color(False, *args, **kwargs)
+
+
 # =============== РАБОТА С MAVEN (remote) ===============
 
-def parse_maven_dependencies(pom_content: str) -> list:
-    """Извлекает прямые зависимости из pom.xml."""
+def _local_name(tag: str) -> str:
+    """Отбрасывает пространство имён: '{ns}artifactId' -> 'artifactId'."""
+    return tag.rpartition('}')[2]
+
+
+def parse_maven_dependencies(pom_content: bytes) -> list:
+    """Извлекает прямые зависимости из pom.xml.
+
+    Документ разбирается потоково за один проход прямо из байтов
+    (кодировку из XML-декларации учитывает сам expat); учитываются только
+    project/dependencies/dependency, поэтому блоки dependencyManagement
+    и зависимости плагинов пропускаются.
+    """
+    # Быстрый выход для pom.xml без зависимостей (например, родительских).
+    # Поиск по байтам допустим только для ASCII-совместимых кодировок и без
+    # учёта регистра: запасной разбор некорректного XML тоже его не учитывает
+    head = pom_content[:4]
+    if (b'dependencies' not in pom_content.lower() and b'\x00' not in head
+            and not head.startswith((b'\xff\xfe', b'\xfe\xff'))):
+        return []
+
     dependencies = []
-    dep_section_match = re.search(r'<dependencies>(.*?)</dependencies>', pom_content, re.DOTALL | re.IGNORECASE)
+    path = []
+    try:
+        for event, elem in ET.iterparse(io.BytesIO(pom_content), events=('start', 'end')):
+            if event == 'start':
+                path.append(_local_name(elem.tag))
+                continue
+
+            if path == ['project', 'dependencies', 'dependency']:
+                fields = {_local_name(child.tag): (child.text or '').strip() for child in elem}
+                gid = fields.get('groupId')
+                aid = fields.get('artifactId')
+                if gid and aid:
+                    dependencies.append(f"{gid}:{aid}")
+                elem.clear()
+            path.pop()
+    except ET.ParseError:
+        # pom.xml с ошибками разметки разбирается запасным способом
+        return _parse_dependencies_regex(pom_content.decode('utf-8', errors='replace'))
+
+    return dependencies
+
+
+def _parse_dependencies_regex(pom_text: str) -> list:
+    """Извлекает зависимости регулярными выражениями (для некорректного XML).
+
+    Поиск идёт по копии в нижнем регистре (только ASCII, длина не меняется),
+    а значения вырезаются из исходного текста по тем же позициям.
+    """
+    search_text = pom_text.translate(_ASCII_LOWER)
+    if '<dependencies>' not in search_text:
+        return []
+
+    dependencies = []
+
+    # Вложенный <dependencies> из dependencyManagement не должен попасть в результат
+    managed = [m.span() for m in _DEP_MANAGEMENT_RE.finditer(search_text)]
+    if managed:
+        kept, pos = [], 0
+        for start, end in managed:
+            kept.append((pos, start))
+            pos = end
+        kept.append((pos, len(search_text)))
+        pom_text = ''.join(pom_text[a:b] for a, b in kept)
+        search_text = ''.join(search_text[a:b] for a, b in kept)
+
+    dep_section_match = _DEP_SECTION_RE.search(search_text)
     if not dep_section_match:
         return dependencies
 
-    dep_section = dep_section_match.group(1)
-    dep_blocks = re.findall(r'<dependency>(.*?)</dependency>', dep_section, re.DOTALL | re.IGNORECASE)
-
-    for block in dep_blocks:
-        group_id = re.search(r'<groupId>(.*?)</groupId>', block, re.IGNORECASE)
-        artifact_id = re.search(r'<artifactId>(.*?)</artifactId>', block, re.IGNORECASE)
-        gid = group_id.group(1).strip() if group_id else None
-        aid = artifact_id.group(1).strip() if artifact_id else None
+    section_start, section_end = dep_section_match.span(1)
+    search_group_id = _GROUP_ID_RE.search
+    search_artifact_id = _ARTIFACT_ID_RE.search
+    for block in _DEP_BLOCK_RE.finditer(search_text, section_start, section_end):
+        block_start, block_end = block.span(1)
+        group_id = search_group_id(search_text, block_start, block_end)
+        artifact_id = search_artifact_id(search_text, block_start, block_end)
+        gid = pom_text[group_id.start(1):group_id.end(1)].strip() if group_id else None
+        aid = pom_text[artifact_id.start(1):artifact_id.end(1)].strip() if artifact_id else None
         if gid and aid:
-            dependencies.append(f"{gid}:{artifact_id}")
+            dependencies.append(f"{gid}:{aid}")
 
     return dependencies
 
 
-def fetch_pom_from_remote(repo_url: str, package_name: str) -> str:
+# Простаивающие соединения по (схема, хост, прокси): запросы BFS к одному
+# репозиторию переиспользуют keep-alive соединения, в том числе из
+# разных потоков (каждое соединение в один момент занято одним потоком)
+_idle_connections = defaultdict(list)
+_connections_lock = threading.Lock()
+_MAX_IDLE_CONNECTIONS = 32
+_HTTP_TIMEOUT = 15
+_HTTP_RETRIES = 3
+_RETRY_BACKOFF = 0.2
+_MAX_REDIRECTS = 5
+# XML из Maven хорошо сжимается: просим сервер отдавать его сжатым
+_REQUEST_HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+# Сколько pom.xml одного уровня BFS загружается одновременно
+_REMOTE_FETCH_WORKERS = 16
+
+
+def _proxy_for(parsed):
+    """Возвращает URL прокси для запроса (HTTP_PROXY/HTTPS_PROXY с учётом
+    NO_PROXY, как у urllib) или None, если ходить нужно напрямую."""
+    proxy = urllib.request.getproxies().get(parsed.scheme)
+    if not proxy or urllib.request.proxy_bypass(parsed.hostname or ''):
+        return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    return proxy
+
+
+def _proxy_authorization(proxy: str) -> dict:
+    """Заголовок Proxy-Authorization из user:pass@ в URL прокси."""
+    parsed = urlparse(proxy)
+    if parsed.username is None:
+        return {}
+    credentials = f"{unquote(parsed.username)}:{unquote(parsed.password or '')}"
+    token = base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+    return {'Proxy-Authorization': f"Basic {token}"}
+
+
+def _acquire_connection(scheme: str, netloc: str, proxy=None) -> http.client.HTTPConnection:
+    with _connections_lock:
+        idle = _idle_connections[(scheme, netloc, proxy)]
+        if idle:
+            return idle.pop()
+    if proxy is None:
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=_HTTP_TIMEOUT)
+        return http.client.HTTPConnection(netloc, timeout=_HTTP_TIMEOUT)
+
+    parsed_proxy = urlparse(proxy)
+    proxy_netloc = parsed_proxy.hostname
+    if parsed_proxy.port:
+        proxy_netloc += f":{parsed_proxy.port}"
+    if scheme == 'https':
+        # HTTPS идёт через CONNECT-туннель, TLS устанавливается с целевым хостом
+        conn = http.client.HTTPSConnection(proxy_netloc, timeout=_HTTP_TIMEOUT)
+        conn.set_tunnel(netloc, headers=_proxy_authorization(proxy))
+        return conn
+    return http.client.HTTPConnection(proxy_netloc, timeout=_HTTP_TIMEOUT)
+
+
+def _release_connection(scheme: str, netloc: str, conn: http.client.HTTPConnection, proxy=None):
+    with _connections_lock:
+        idle = _idle_connections[(scheme, netloc, proxy)]
+        if len(idle) < _MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def _send_get(conn: http.client.HTTPConnection, path: str, headers=_REQUEST_HEADERS) -> tuple:
+    """Отправляет GET и читает ответ; при обрыве соединения или таймауте
+    повторяет запрос (первый повтор сразу — обычно это закрытое сервером
+    простаивающее соединение, следующие с нарастающей паузой)."""
+    for attempt in range(_HTTP_RETRIES + 1):
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            return response, response.read()
+        except (ConnectionError, socket.timeout):
+            conn.close()
+            if attempt == _HTTP_RETRIES:
+                raise
+            if attempt:
+                time.sleep(_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+
+def _decode_body(body: bytes, content_encoding) -> bytes:
+    """Распаковывает тело ответа согласно Content-Encoding."""
+    encoding = (content_encoding or '').strip().lower()
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        # Часть серверов отдаёт «голый» deflate без zlib-заголовка
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+def _http_get(url: str) -> bytes:
+    """Выполняет GET-запрос, переиспользуя соединение с хостом."""
+    for _ in range(_MAX_REDIRECTS + 1):
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        proxy = _proxy_for(parsed)
+        headers = _REQUEST_HEADERS
+        if proxy is not None and parsed.scheme == 'http':
+            # HTTP-прокси ждёт абсолютный URI в строке запроса
+            path = f"http://{parsed.netloc}{path}"
+            headers = {**_REQUEST_HEADERS, **_proxy_authorization(proxy)}
+
+        conn = _acquire_connection(parsed.scheme, parsed.netloc, proxy)
+        try:
+            response, body = _send_get(conn, path, headers)
+        except Exception:
+            conn.close()
+            raise
+        _release_connection(parsed.scheme, parsed.netloc, conn, proxy)
+
+        if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+            url = urljoin(url, response.getheader('Location'))
+            continue
+        if response.status != 200:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+        return _decode_body(body, response.getheader('Content-Encoding'))
+
+    raise RuntimeError(f"Слишком много перенаправлений: {url}")
+
+
+def _select_version(metadata: bytes):
+    """Выбирает версию из maven-metadata.xml: release, затем latest,
+    затем последняя из перечисленных версий.
+
+    Документ читается потоково; найдя release, разбор сразу останавливается,
+    а из списка версий хранится только последняя.
+    """
+    latest = last_version = None
+    path = []
+    try:
+        for event, elem in ET.iterparse(io.BytesIO(metadata), events=('start', 'end')):
+            if event == 'start':
+                path.append(_local_name(elem.tag))
+                continue
+
+            location = path[1:]
+            if location == ['versioning', 'release']:
+                release = (elem.text or '').strip()
+                if release:
+                    return release
+            elif location == ['versioning', 'latest']:
+                latest = (elem.text or '').strip() or latest
+            elif location == ['versioning', 'versions', 'version']:
+                last_version = (elem.text or '').strip() or last_version
+                elem.clear()
+            path.pop()
+    except ET.ParseError as e:
+        raise RuntimeError(f"Некорректный maven-metadata.xml: {e}")
+
+    return latest or last_version
+
+
+def fetch_pom_from_remote(repo_url: str, package_name: str) -> bytes:
     parts = package_name.split(':', 1)
     if len(parts) != 2:
         raise ValueError("Имя пакета должно быть в формате 'groupId:artifactId'.")
@@ -72,30 +353,17 @@ def fetch_pom_from_remote(repo_url: str, package_name: str) -> str:
     metadata_url = f"{base_url}/maven-metadata.xml"
 
     try:
-        with urllib.request.urlopen(metadata_url) as response:
-            metadata = response.read().decode('utf-8')
+        metadata = _http_get(metadata_url)
     except Exception as e:
         raise RuntimeError(f"Не удалось загрузить maven-metadata.xml из {metadata_url}: {e}")
 
-    version = None
-    for pattern in [r'<release>([^<]+)</release>', r'<latest>([^<]+)</latest>']:
-        match = re.search(pattern, metadata)
-        if match:
-            version = match.group(1).strip()
-            break
-
-    if not version:
-        versions = re.findall(r'<version>([^<]+)</version>', metadata)
-        if versions:
-            version = versions[-1].strip()
-
+    version = _select_version(metadata)
     if not version:
         raise RuntimeError("Не удалось определить версию пакета.")
 
     pom_url = f"{base_url}/{version}/{artifact_id}-{version}.pom"
     try:
-        with urllib.request.urlopen(pom_url) as response:
-            return response.read().decode('utf-8')
+        return _http_get(pom_url)
     except urllib.error.HTTPError as e:
         if e.code == 404:
             raise RuntimeError(f"pom.xml не найден: {pom_url}")
@@ -104,80 +372,241 @@ def fetch_pom_from_remote(repo_url: str, package_name: str) -> str:
         raise RuntimeError(f"Не удалось загрузить pom.xml: {e}")
 
 
+# Дисковый кэш разобранных зависимостей: повторные запуски не скачивают
+# pom.xml заново, пока запись не устарела. Кэш хранится в каталоге
+# пользователя (не в общей временной папке), а переменная окружения
+# PRACTICA2_NO_CACHE=1 отключает его
+_DISK_CACHE_TTL = 24 * 60 * 60
+
+
+def _default_cache_dir() -> str:
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'practica2', 'pom_cache')
+
+
+_DISK_CACHE_DIR = _default_cache_dir()
+
+
+def _disk_cache_enabled() -> bool:
+    return not os.environ.get('PRACTICA2_NO_CACHE')
+
+
+def _cache_dir_is_safe() -> bool:
+    """Каталог кэша должен принадлежать текущему пользователю и быть
+    недоступен на запись остальным, иначе записи могли подменить."""
+    try:
+        st = os.lstat(_DISK_CACHE_DIR)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        return False
+    if not hasattr(os, 'getuid'):
+        # Windows: каталог и так находится в профиле пользователя
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _disk_cache_path(repo_url: str, package_name: str) -> str:
+    key = f"{repo_url.rstrip('/')}\n{package_name}".encode('utf-8')
+    return os.path.join(_DISK_CACHE_DIR, hashlib.blake2b(key, digest_size=16).hexdigest() + '.json')
+
+
+def _read_disk_cache(path: str):
+    if not _cache_dir_is_safe():
+        return None
+    try:
+        if time.time() - os.path.getmtime(path) > _DISK_CACHE_TTL:
+            return None
+        with open(path, 'rb') as f:
+            deps = _json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+    # Испорченная запись (не список строк) считается промахом кэша
+    if not isinstance(deps, list) or not all(isinstance(d, str) for d in deps):
+        return None
+    return deps
+
+
+def _write_disk_cache(path: str, deps: list):
+    """Записывает кэш атомарно; ошибки записи не мешают работе."""
+    try:
+        os.makedirs(_DISK_CACHE_DIR, mode=0o700, exist_ok=True)
+    except OSError:
+        return
+    if not _cache_dir_is_safe():
+        return
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=_DISK_CACHE_DIR, suffix='.tmp')
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(deps, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def make_remote_fetcher(repo_url: str):
+    """Возвращает функцию pkg -> список зависимостей для удалённого репозитория."""
+    def fetch_uncached(package_name: str) -> list:
+        return parse_maven_dependencies(fetch_pom_from_remote(repo_url, package_name))
+
+    if not _disk_cache_enabled():
+        return fetch_uncached
+
+    def fetch(package_name: str) -> list:
+        cache_path = _disk_cache_path(repo_url, package_name)
+        deps = _read_disk_cache(cache_path)
+        if deps is None:
+            deps = fetch_uncached(package_name)
+            _write_disk_cache(cache_path, deps)
+        return deps
+    return fetch
+
+
 # =============== РАБОТА С MOCK (JSON) ===============
 
-def fetch_dependencies_mock(mock_file_path: str, package_name: str) -> list:
-    if not os.path.isfile(mock_file_path):
+def load_mock_repo(mock_file_path: str) -> dict:
+    """Загружает JSON-репозиторий; неизменённый файл повторно не читается."""
+    try:
+        mtime = os.stat(mock_file_path).st_mtime_ns
+    except FileNotFoundError:
         raise FileNotFoundError(f"Файл не найден: {mock_file_path}")
+    return _read_mock_repo(mock_file_path, mtime)
 
+
+@functools.lru_cache(maxsize=8)
+def _read_mock_repo(mock_file_path: str, mtime: int) -> dict:
     try:
-        with open(mock_file_path, 'r', encoding='utf-8') as f:
-            repo = json.load(f)
+        with open(mock_file_path, 'rb') as f:
+            repo = _json_loads(f.read())
+    except (FileNotFoundError, IsADirectoryError):
+        raise FileNotFoundError(f"Файл не найден: {mock_file_path}")
     except json.JSONDecodeError as e:
         raise ValueError(f"Некорректный JSON: {e}")
 
+    if not isinstance(repo, dict):
+        raise ValueError("Репозиторий должен быть JSON-объектом.")
+    return repo
+
+
+def fetch_dependencies_mock(mock_file_path: str, package_name: str) -> list:
+    """Возвращает зависимости пакета из JSON-файла (файл разбирается один раз)."""
+    return mock_dependencies_of(load_mock_repo(mock_file_path), package_name)
+
+
+def mock_dependencies_of(repo: dict, package_name: str) -> list:
+    """Возвращает зависимости пакета из уже загруженного репозитория."""
     if package_name not in repo:
         raise ValueError(f"Пакет '{package_name}' отсутствует в репозитории.")
 
     deps = repo[package_name]
     if not isinstance(deps, list):
         raise ValueError(f"Зависимости должны быть списком.")
-    return [str(d).strip() for d in deps if d]
+    stripped = (d.strip() if isinstance(d, str) else str(d).strip() for d in deps if d)
+    return [d for d in stripped if d]
+
+
+def make_mock_fetcher(repo: dict):
+    """Возвращает функцию pkg -> список зависимостей, привязанную к загруженному репозиторию."""
+    return functools.partial(mock_dependencies_of, repo)
 
 
 # =============== BFS: ПРЯМОЙ ГРАФ (этап 3) ===============
 
+def _fetch_safely(fetch_deps_func, package: str) -> tuple:
+    """Вызывает fetch_deps_func в рабочем потоке, возвращая (зависимости, ошибка)."""
+    try:
+        return fetch_deps_func(package), None
+    except Exception as e:
+        return None, e
+
+
+def _drop_filtered(deps: list, filter_substring: str, filtered_out: set) -> list:
+    """Возвращает deps без пакетов, содержащих filter_substring; отброшенные
+    пакеты добавляются в filtered_out."""
+    kept = [dep for dep in deps if filter_substring not in dep]
+    if len(kept) != len(deps):
+        filtered_out.update(dep for dep in deps if filter_substring in dep)
+    return kept
+
+
 def bfs_build_dependency_graph(
     start_package: str,
     fetch_deps_func,
-    filter_substring: str = ""
+    filter_substring: str = "",
+    max_workers: int = 1
 ) -> dict:
-    nodes = set()
-    edges = []
-    cycles = []
+    """Обходит граф по уровням. При max_workers > 1 зависимости всех пакетов
+    одного уровня загружаются параллельно, а сам граф обновляется в основном
+    потоке."""
+    # Список смежности: ключи — узлы графа, значения — исходящие рёбра
+    adjacency = {start_package: []}
+    # Уникальные циклы по неупорядоченной паре концов, в порядке обнаружения
+    cycles = {}
     filtered_out = set()
 
     depth_map = {start_package: 0}
-    queue = deque([(start_package, 0)])
-    nodes.add(start_package)
-
-    while queue:
-        current, curr_depth = queue.popleft()
-
-        try:
-            direct_deps = fetch_deps_func(current)
-        except Exception as e:
-            print(f"⚠ Пропущен пакет {current}: {e}", file=sys.stderr)
-            continue
-
-        for dep in direct_deps:
-            if filter_substring and filter_substring in dep:
-                filtered_out.add(dep)
-                continue
+    frontier = [start_package]
+    curr_depth = 0
+    fetch = functools.partial(_fetch_safely, fetch_deps_func)
+    # Методы, вызываемые на каждом ребре, связываются с локальными именами
+    get_depth = depth_map.get
+
+    # Параллельная загрузка нужна только для сетевых источников
+    if max_workers > 1:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        map_fetch = executor.map
+    else:
+        executor = None
+        map_fetch = map
 
-            edges.append((current, dep))
-
-            if dep in depth_map:
-                dep_depth = depth_map[dep]
-                if dep_depth <= curr_depth:
-                    cycles.append([current, dep])
-            else:
-                depth_map[dep] = curr_depth + 1
-                nodes.add(dep)
-                queue.append((dep, curr_depth + 1))
-
-    unique_cycles = []
-    seen = set()
-    for cyc in cycles:
-        key = frozenset(cyc)
-        if key not in seen:
-            seen.add(key)
-            unique_cycles.append(cyc)
+    try:
+        while frontier:
+            next_frontier = []
+            add_to_frontier = next_frontier.append
+
+            for current, (direct_deps, error) in zip(frontier, map_fetch(fetch, frontier)):
+                if error is not None:
+                    print(f"⚠ Пропущен пакет {current}: {error}", file=sys.stderr)
+                    continue
+
+                # Фильтр применяется ко всему списку сразу, а не к каждому ребру
+                if filter_substring:
+                    direct_deps = _drop_filtered(direct_deps, filter_substring, filtered_out)
+
+                add_edge = adjacency[current].append
+                for dep in direct_deps:
+                    add_edge(dep)
+
+                    dep_depth = get_depth(dep)
+                    if dep_depth is None:
+                        depth_map[dep] = curr_depth + 1
+                        adjacency[dep] = []
+                        add_to_frontier(dep)
+                    elif dep_depth <= curr_depth:
+                        key = (current, dep) if current < dep else (dep, current)
+                        if key not in cycles:
+                            cycles[key] = [current, dep]
+
+            frontier = next_frontier
+            curr_depth += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     return {
-        'nodes': nodes,
-        'edges': edges,
-        'cycles': unique_cycles,
+        'nodes': adjacency.keys(),
+        'edges': [(src, dst) for src, dsts in adjacency.items() for dst in dsts],
+        'adjacency': adjacency,
+        'cycles': list(cycles.values()),
         'filtered_out': filtered_out
     }
 
@@ -190,7 +619,8 @@ def bfs_reverse_dependencies(
     fetch_deps_func,
     filter_substring: str = ""
 ) -> dict:
-    forward_edges = []
+    # Обратный список смежности строится сразу, без промежуточного списка рёбер
+    reverse_adj = defaultdict(list)
     filtered_out = set()
 
     for pkg in all_packages:
@@ -201,32 +631,33 @@ def bfs_reverse_dependencies(
             deps = fetch_deps_func(pkg)
         except:
             continue
+        if filter_substring:
+            deps = _drop_filtered(deps, filter_substring, filtered_out)
         for dep in deps:
-            if filter_substring and filter_substring in dep:
-                filtered_out.add(dep)
-                continue
-            forward_edges.append((pkg, dep))
-
-    reverse_adj = defaultdict(list)
-    for src, dst in forward_edges:
-        reverse_adj[dst].append(src)
+            reverse_adj[dep].append(pkg)
 
-    dependents = set()
-    visited = set()
+    visited = {target_package}
     queue = deque([target_package])
-    visited.add(target_package)
+    get_dependers = reverse_adj.get
+    mark_visited = visited.add
+    enqueue = queue.append
+    dequeue = queue.popleft
 
     while queue:
-        current = queue.popleft()
-        for depender in reverse_adj.get(current, []):
+        current = dequeue()
+        for depender in get_dependers(current, ()):
             if depender not in visited:
-                visited.add(depender)
-                dependents.add(depender)
-                queue.append(depender)
+                mark_visited(depender)
+                enqueue(depender)
 
+    # Все посещённые пакеты, кроме самого целевого, зависят от него
+    dependents = visited
     dependents.discard(target_package)
 
-    edges = [(dep, target_package) for dep in dependents if (dep, target_package) in forward_edges]
+    # Прямые рёбра к целевому пакету берутся из обратного списка смежности,
+    # а не поиском каждой пары в списке всех рёбер
+    direct_predecessors = dict.fromkeys(reverse_adj.get(target_package, ()))
+    edges = [(src, target_package) for src in direct_predecessors if src in dependents]
     return {
         'dependents': dependents,
         'edges': edges,
@@ -236,6 +667,18 @@ def bfs_reverse_dependencies(
 
 # =============== ЭТАП 5: ВИЗУАЛИЗАЦИЯ ===============
 
+def sorted_edges(adjacency: dict):
+    """Перебирает рёбра в порядке (источник, приёмник).
+
+    Рёбра уже сгруппированы по источнику, поэтому сортируются только
+    источники и короткие списки зависимостей каждого из них, а не весь
+    список пар целиком.
+    """
+    for src in sorted(adjacency):
+        for dst in sorted(adjacency[src]):
+            yield src, dst
+
+
 def generate_plantuml(graph: dict, start_package: str) -> str:
     """Генерирует PlantUML-код для графа зависимостей."""
     lines = [
@@ -255,9 +698,10 @@ def generate_plantuml(graph: dict, start_package: str) -> str:
             lines.append(f'node "{node}"')
 
     # Рёбра
-    for src, dst in sorted(graph['edges']):
+    cycle_pairs = {(a, b) if a < b else (b, a) for a, b in graph['cycles']}
+    for src, dst in sorted_edges(graph['adjacency']):
         style = ""
-        if [src, dst] in graph['cycles'] or [dst, src] in graph['cycles']:
+        if ((src, dst) if src < dst else (dst, src)) in cycle_pairs:
             style = " #red,dashed"
         lines.append(f'"{src}" --> "{dst}"{style}')
 
@@ -286,25 +730,34 @@ def save_plantuml_as_png(plantuml_code: str, output_path: str):
         print("   Совет: проверьте подключение к интернету и длину диаграммы (макс. ~2000 символов).")
 
 
+# Дерево может быть очень большим (общие поддеревья раскрываются заново),
+# поэтому строки выводятся порциями, а не накапливаются целиком
+_ASCII_TREE_CHUNK_LINES = 256
+
+
 def print_ascii_tree(graph: dict, start_package: str):
     """Выводит зависимости в виде ASCII-дерева с обработкой циклов."""
     print(f"\n=== ASCII-дерево зависимостей для {start_package} ===")
 
-    from collections import defaultdict
-    children = defaultdict(list)
-    for src, dst in graph['edges']:
-        children[src].append(dst)
+    children = graph['adjacency']
+    lines = []
+
+    def emit(line):
+        lines.append(line)
+        if len(lines) >= _ASCII_TREE_CHUNK_LINES:
+            _write_lines(lines)
+            lines.clear()
 
     def print_node(pkg, prefix="", is_last=True, visited=None):
         if visited is None:
             visited = set()
         if pkg in visited:
-            print(prefix + ("└── " if is_last else "├── ") + f"{pkg} [CYCLE]")
+            emit(prefix + ("└── " if is_last else "├── ") + f"{pkg} [CYCLE]")
             return
         visited.add(pkg)
 
         connector = "└── " if is_last else "├── "
-        print(prefix + connector + pkg)
+        emit(prefix + connector + pkg)
         next_prefix = prefix + ("    " if is_last else "│   ")
         deps = sorted(children.get(pkg, []))
         for i, dep in enumerate(deps):
@@ -312,12 +765,21 @@ def print_ascii_tree(graph: dict, start_package: str):
             print_node(dep, next_prefix, is_last_dep, visited.copy())
 
     print_node(start_package)
+    _write_lines(lines)
 
 # =============== ОСНОВНАЯ ФУНКЦИЯ ===============
 
+def _write_lines(lines):
+    """Выводит строки одной записью в stdout вместо print() на каждую."""
+    text = "\n".join(lines)
+    if text:
+        sys.stdout.write(text + "\n")
+
+
 def main():
     parser = argparse.ArgumentParser(
-        description="Инструмент анализа графа зависимостей (этапы 1–5)."
+        description="Инструмент анализа графа зависимостей (этапы 1–5).",
+        formatter_class=_PlainHelpFormatter
     )
     parser.add_argument('--package', type=validate_package_name, required=True)
     parser.add_argument('--repo-source', type=str, required=True)
@@ -351,21 +813,28 @@ def main():
     print(f"  reverse: {args.reverse}\n")
 
     if args.repo_mode == 'remote':
-        fetch_deps = lambda pkg: parse_maven_dependencies(
-            fetch_pom_from_remote(args.repo_source, pkg)
-        )
+        fetch_deps = make_remote_fetcher(args.repo_source)
     elif args.repo_mode == 'mock':
-        fetch_deps = lambda pkg: fetch_dependencies_mock(args.repo_source, pkg)
+        try:
+            mock_repo = load_mock_repo(args.repo_source)
+        except Exception as e:
+            print(f"Ошибка загрузки репозитория: {e}", file=sys.stderr)
+            sys.exit(1)
+        fetch_deps = make_mock_fetcher(mock_repo)
     else:
         print("Режим 'local' не поддерживается.", file=sys.stderr)
         sys.exit(1)
 
+    # Каждый пакет загружается и разбирается не более одного раза
+    fetch_deps = functools.lru_cache(maxsize=None)(fetch_deps)
+
     # === Этап 3: прямой граф ===
     try:
         graph = bfs_build_dependency_graph(
             start_package=args.package,
             fetch_deps_func=fetch_deps,
-            filter_substring=args.filter
+            filter_substring=args.filter,
+            max_workers=_REMOTE_FETCH_WORKERS if args.repo_mode == 'remote' else 1
         )
     except Exception as e:
         print(f"Ошибка при построении графа: {e}", file=sys.stderr)
@@ -376,12 +845,10 @@ def main():
     if graph['filtered_out']:
         print("Отфильтровано:", ", ".join(sorted(graph['filtered_out'])))
     print("Рёбра:")
-    for src, dst in sorted(graph['edges']):
-        print(f"  {src} → {dst}")
+    _write_lines(f"  {src} → {dst}" for src, dst in sorted_edges(graph['adjacency']))
     if graph['cycles']:
         print("⚠ Циклы:")
-        for i, cyc in enumerate(graph['cycles'], 1):
-            print(f"  {i}. {' → '.join(cyc)}")
+        _write_lines(f"  {i}. {' → '.join(cyc)}" for i, cyc in enumerate(graph['cycles'], 1))
     else:
         print("Циклов нет.")
 
@@ -392,13 +859,8 @@ def main():
             print("Обратные зависимости доступны только в --repo-mode=mock.", file=sys.stderr)
             sys.exit(1)
 
-        try:
-            with open(args.repo_source, 'r', encoding='utf-8') as f:
-                repo_data = json.load(f)
-            all_packages = set(repo_data.keys())
-        except Exception as e:
-            print(f"Ошибка загрузки репозитория: {e}", file=sys.stderr)
-            sys.exit(1)
+        # Репозиторий уже загружен перед построением прямого графа
+        all_packages = set(mock_repo)
 
         try:
             rev = bfs_reverse_dependencies(
@@ -413,8 +875,7 @@ def main():
 
         print(f"Пакеты, зависящие от '{args.package}': {len(rev['dependents'])}")
         if rev['dependents']:
-            for pkg in sorted(rev['dependents']):
-                print(f"  - {pkg}")
+            _write_lines(f"  - {pkg}" for pkg in sorted(rev['dependents']))
         else:
             print("  Нет.")
 
@@ -424,8 +885,7 @@ def main():
     # 1. PlantUML
     plantuml_code = generate_plantuml(graph, args.package)
     print("Сгенерирован PlantUML-код (фрагмент):")
-    for line in plantuml_code.splitlines()[:8]:
-        print(f"  {line}")
+    _write_lines(f"  {line}" for line in plantuml_code.splitlines()[:8])
     print("  ...")
 
     # 2. Сохранение PNG
@@ -438,8 +898,9 @@ def main():
     if args.ascii_tree:
         print_ascii_tree(graph, args.package)
 
-    # === Демо ===
-    if args.repo_mode == 'mock' and not args.reverse and not args.ascii_tree:
+    # === Демо (только по запросу: PRACTICA2_DEMO=1) ===
+    if (os.environ.get('PRACTICA2_DEMO') and args.repo_mode == 'mock'
+            and not args.reverse and not args.ascii_tree):
         demo = {"A": ["B", "C"], "B": ["D"], "C": ["D", "E"], "D": [], "E": ["B"]}
         demo_path = os.path.join(tempfile.gettempdir(), "demo_repo.json")
         with open(demo_path, 'w', encoding='utf-8') as f: